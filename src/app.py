@@ -8,6 +8,7 @@ from plotly.graph_objs import Figure
 
 from bot import ChatBot
 from prompt import SYSTEM_PROMPT
+from sql_repair import iterations_saved, start_turn
 from tools import plot_chart, run_sqlite_query, tools_schema
 
 # Compute the absolute path to the directory where this script resides (src/)
@@ -68,6 +69,7 @@ async def on_chat_start():
 @cl.on_message
 async def on_message(message: cl.Message):
     bot = cl.user_session.get("bot")
+    start_turn()
 
     msg = cl.Message(author="Assistant", content="")
     await msg.send()
@@ -104,3 +106,5 @@ async def on_message(message: cl.Message):
         else:
             break
         cur_iter += 1
+
+    logger.info(f"LLM iterations saved by SQL repair this turn: {iterations_saved()}")
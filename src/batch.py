@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+# Compute the absolute path to the directory where this script resides (src/)
+src_dir = os.path.dirname(os.path.realpath(__file__))
+# Compute the project root directory (one level up from src/)
+project_root = os.path.join(src_dir, "..")
+
+# Load environment variables before importing the bot, which creates the
+# OpenAI client at import time.
+load_dotenv(os.path.join(project_root, ".env"))
+
+from bot import ChatBot  # noqa: E402
+from prompt import SYSTEM_PROMPT  # noqa: E402
+from sql_repair import iterations_saved, prepare_sql, start_turn  # noqa: E402
+from tools import DB_PATH, plot_chart, run_prepared_query, tools_schema  # noqa: E402
+
+MAX_ITER = 5
+CHECKPOINT_FILE = "checkpoint.jsonl"
+SUMMARY_FILE = "summary.json"
+# Ids become output file names, so they are limited to a safe character set.
+QUESTION_ID_RE = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9_.-]*")
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces out calls so that at most `rate` of them start per minute."""
+
+    def __init__(self, rate):
+        self.interval = 60.0 / rate if rate else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class BatchChatBot(ChatBot):
+    """ChatBot whose completions share a rate limiter across concurrent questions."""
+
+    def __init__(self, system, tools, tool_functions, rate_limiter):
+        super().__init__(system, tools, tool_functions)
+        self.rate_limiter = rate_limiter
+        self.llm_calls = 0
+
+    async def execute(self):
+        await self.rate_limiter.acquire()
+        self.llm_calls += 1
+        return await super().execute()
+
+
+def load_questions(path):
+    """Read questions from a JSONL file.
+
+    Each line needs a `question` (or `body`) field; `id` (or `request_id`)
+    is used as the output file name and defaults to the line number. Ids must
+    be unique and contain only letters, digits, `_`, `-` and `.`.
+    """
+    questions = []
+    seen = set()
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            question = record.get("question") or record.get("body")
+            if not question:
+                raise ValueError(f"Line {line_no} of {path} has no question")
+            question_id = str(record.get("id") or record.get("request_id") or line_no)
+            if not QUESTION_ID_RE.fullmatch(question_id):
+                raise ValueError(f"Line {line_no} of {path} has an invalid id: {question_id!r}")
+            if question_id in seen:
+                raise ValueError(f"Line {line_no} of {path} repeats id {question_id!r}")
+            seen.add(question_id)
+            questions.append({"id": question_id, "question": question})
+    return questions
+
+
+def load_checkpoint(output_dir):
+    """Return the ids of questions already answered in a previous run."""
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(checkpoint_path):
+        return set()
+    done = set()
+    with open(checkpoint_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                done.add(json.loads(line)["id"])
+    return done
+
+
+async def answer_question(question_id, question, rate_limiter):
+    """Run the tool loop from `app.on_message` headlessly and collect its outputs."""
+    queries = []
+    charts = []
+
+    async def recorded_run_sqlite_query(sql_query):
+        # Record the statement that actually ran, which SQL repair may have changed.
+        prepared_sql, corrections, hint = prepare_sql(sql_query, DB_PATH)
+        result = await run_prepared_query(prepared_sql, corrections, hint)
+        queries.append({"sql": prepared_sql, "requested_sql": sql_query, "result": result})
+        return result
+
+    async def recorded_plot_chart(**kwargs):
+        fig = await plot_chart(**kwargs)
+        charts.append(fig.to_json())
+        return fig
+
+    tool_functions = {
+        "query_db": recorded_run_sqlite_query,
+        "plot_chart": recorded_plot_chart,
+    }
+    bot = BatchChatBot(SYSTEM_PROMPT, tools_schema, tool_functions, rate_limiter)
+
+    start = time.perf_counter()
+    start_turn()
+    response_message = await bot(question)
+    answers = [response_message.content] if response_message.content else []
+
+    # Process tool calls iteratively (up to MAX_ITER iterations).
+    cur_iter = 0
+    tool_calls = response_message.tool_calls
+    while cur_iter <= MAX_ITER and tool_calls:
+        bot.messages.append(response_message)
+        response_message, function_responses = await bot.call_functions(tool_calls)
+        if response_message.content:
+            answers.append(response_message.content)
+        tool_calls = response_message.tool_calls
+        cur_iter += 1
+
+    return {
+        "id": question_id,
+        "question": question,
+        "answer": "\n\n".join(answers),
+        "queries": queries,
+        "charts": charts,
+        "llm_calls": bot.llm_calls,
+        "iterations_saved": iterations_saved(),
+        "latency": time.perf_counter() - start,
+    }
+
+
+async def run_batch(questions, output_dir, workers=4, rate_limit=0):
+    """Answer `questions` concurrently, writing one JSON file per question.
+
+    Questions already listed in the output directory's checkpoint are skipped,
+    so an interrupted run can be resumed by pointing it at the same directory.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    done = load_checkpoint(output_dir)
+    pending = [q for q in questions if q["id"] not in done]
+    logger.info(
+        "Batch run: %d questions, %d already done, %d pending",
+        len(questions), len(questions) - len(pending), len(pending),
+    )
+
+    semaphore = asyncio.Semaphore(workers)
+    rate_limiter = RateLimiter(rate_limit)
+    checkpoint_lock = asyncio.Lock()
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+    latencies = []
+    saved = []
+    failures = []
+
+    async def worker(item):
+        try:
+            async with semaphore:
+                result = await answer_question(item["id"], item["question"], rate_limiter)
+
+            with open(os.path.join(output_dir, f"{item['id']}.json"), "w") as f:
+                json.dump(result, f, indent=2, default=str)
+            async with checkpoint_lock:
+                with open(checkpoint_path, "a") as f:
+                    f.write(json.dumps({"id": item["id"], "latency": result["latency"]}) + "\n")
+        except Exception as e:
+            logger.exception("Question %s failed", item["id"])
+            failures.append({"id": item["id"], "error": str(e)})
+            return
+
+        latencies.append(result["latency"])
+        saved.append(result["iterations_saved"])
+        logger.info("Question %s answered in %.2fs", item["id"], result["latency"])
+        print(f"[{len(latencies)}/{len(pending)}] {item['id']} ({result['latency']:.2f}s)")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(item) for item in pending))
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        "total": len(questions),
+        "skipped": len(questions) - len(pending),
+        "answered": len(latencies),
+        "failed": failures,
+        "elapsed_seconds": elapsed,
+        "throughput_per_minute": len(latencies) / elapsed * 60 if elapsed else 0.0,
+        "latency_mean": statistics.mean(latencies) if latencies else None,
+        "latency_median": statistics.median(latencies) if latencies else None,
+        "latency_max": max(latencies) if latencies else None,
+        "iterations_saved_total": sum(saved),
+        "iterations_saved_per_question": statistics.mean(saved) if saved else None,
+    }
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answer a JSONL file of questions with the chatbot, without the UI."
+    )
+    parser.add_argument("input", help="JSONL file with one question per line")
+    parser.add_argument("output_dir", help="directory for answers, checkpoint and summary")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of questions processed concurrently (default: 4)")
+    parser.add_argument("--rate-limit", type=float, default=0,
+                        help="maximum OpenAI requests per minute, 0 for no limit (default: 0)")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.rate_limit < 0:
+        parser.error("--rate-limit must not be negative")
+
+    # Configure logging; log file will be stored in the project root.
+    # force=True because importing bot already logged and configured the root logger.
+    logging.basicConfig(filename=os.path.join(project_root, "batch.log"), level=logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+
+    questions = load_questions(args.input)
+    summary = asyncio.run(run_batch(questions, args.output_dir, args.workers, args.rate_limit))
+
+    print(f"Answered {summary['answered']} of {summary['total']} questions "
+          f"({summary['skipped']} resumed from checkpoint, {len(summary['failed'])} failed) "
+          f"in {summary['elapsed_seconds']:.1f}s")
+    print(f"Throughput: {summary['throughput_per_minute']:.1f} questions/minute")
+    if summary["latency_mean"] is not None:
+        print(f"Latency: mean {summary['latency_mean']:.2f}s, "
+              f"median {summary['latency_median']:.2f}s, max {summary['latency_max']:.2f}s")
+        print(f"LLM iterations saved by SQL repair: {summary['iterations_saved_total']} "
+              f"({summary['iterations_saved_per_question']:.2f} per question)")
+
+
+if __name__ == '__main__':
+    main()
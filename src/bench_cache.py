@@ -0,0 +1,106 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from cache import SharedCache, db_version, make_key
+from utils import convert_to_json, json_to_markdown_table
+
+# Get the directory of the current script (e.g. src/)
+script_dir = os.path.dirname(os.path.realpath(__file__))
+DB_PATH = os.path.join(script_dir, "..", "data", "db", "school.db")
+
+
+def build_queries():
+    """Queries of the shape the chatbot generates, one per student, term and topic."""
+    connection = sqlite3.connect(DB_PATH)
+    students = [row[0] for row in connection.execute("SELECT name FROM students")]
+    terms = [row[0] for row in connection.execute("SELECT termName FROM terms")]
+    connection.close()
+
+    queries = []
+    for table in ("attendance", "behaviour", "attainment"):
+        for name in students:
+            for term in terms:
+                queries.append(
+                    f"SELECT t.* FROM {table} t JOIN students s ON s.studentId = t.studentId "
+                    f"WHERE s.name = '{name}' AND t.termName = '{term}'"
+                )
+    return queries
+
+
+def run_query(sql_query):
+    connection = sqlite3.connect(DB_PATH)
+    try:
+        cursor = connection.execute(sql_query)
+        column_names = [desc[0] for desc in cursor.description]
+        return json_to_markdown_table(convert_to_json(cursor.fetchall(), column_names))
+    finally:
+        connection.close()
+
+
+def worker(args):
+    """Serve `requests` queries drawn from a skewed distribution, as one chatbot process would."""
+    mode, cache_path, queries, requests, seed = args
+    rng = random.Random(seed)
+    # Popular questions (e.g. the current term) are asked far more often than others.
+    weights = [1.0 / (rank + 1) for rank in range(len(queries))]
+    namespace = db_version(DB_PATH)
+    local_cache = {}
+    shared_cache = SharedCache(cache_path) if mode == "shared" else None
+    hits = misses = 0
+
+    start = time.perf_counter()
+    for sql_query in rng.choices(queries, weights=weights, k=requests):
+        key = make_key(namespace, "query", [sql_query, True])
+        if mode == "shared":
+            if shared_cache.get(key) is None:
+                shared_cache.set(key, run_query(sql_query))
+        else:
+            if key in local_cache:
+                hits += 1
+            else:
+                misses += 1
+                local_cache[key] = run_query(sql_query)
+    elapsed = time.perf_counter() - start
+
+    if shared_cache:
+        hits, misses = shared_cache.hits, shared_cache.misses
+        shared_cache.close()
+    return hits, misses, elapsed
+
+
+def run(mode, processes, requests):
+    queries = build_queries()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, "bench_cache.db")
+        jobs = [(mode, cache_path, queries, requests, seed) for seed in range(processes)]
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(worker, jobs)
+    hits = sum(result[0] for result in results)
+    misses = sum(result[1] for result in results)
+    elapsed = max(result[2] for result in results)
+    return hits / (hits + misses), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare per-process and shared cache hit rates across worker processes."
+    )
+    parser.add_argument("--processes", type=int, default=4,
+                        help="number of worker processes (default: 4)")
+    parser.add_argument("--requests", type=int, default=50,
+                        help="queries served by each process (default: 50)")
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.requests} queries")
+    for mode in ("local", "shared"):
+        hit_rate, elapsed = run(mode, args.processes, args.requests)
+        print(f"{mode:>6}: hit rate {hit_rate:.1%}, slowest worker {elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
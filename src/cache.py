@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Compute the absolute path to the directory where this script resides (src/)
+src_dir = os.path.dirname(os.path.realpath(__file__))
+# Cache lives next to the school database so every worker on the host shares it.
+DEFAULT_CACHE_PATH = os.path.join(src_dir, "..", "data", "cache", "shared_cache.db")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Keep lock waits short: a busy cache should behave like a miss, not stall a tool call.
+BUSY_TIMEOUT = 0.5
+# Hits only refresh an entry's recency once per interval, so most reads take no write lock.
+ACCESS_UPDATE_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def db_version(db_path):
+    """Identify the current build of a database file.
+
+    `initialise_db.py` recreates the file from scratch, so its modification
+    time and size change whenever the data does.
+    """
+    stat = os.stat(db_path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def make_key(namespace, kind, payload):
+    """Build a cache key from a namespace, an entry kind and a JSON-serialisable payload."""
+    digest = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    return f"{namespace}:{kind}:{digest}"
+
+
+class SharedCache:
+    """Size-bounded key-value store backed by a SQLite file.
+
+    Several processes can open the same file: writes are single transactions
+    in WAL mode, so readers never see a partially written entry. When the
+    total size of stored values exceeds `max_bytes`, the least recently
+    used entries are evicted. Recency is approximate: it is refreshed at most
+    once every `ACCESS_UPDATE_INTERVAL` seconds per entry.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def connect(self):
+        if self.connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    size INTEGER,
+                    accessed REAL
+                )
+            ''')
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache(accessed)")
+            self.connection = connection
+        return self.connection
+
+    def get(self, key):
+        """Return the value stored under `key`, or None if it is not cached."""
+        with self.lock:
+            connection = self.connect()
+            row = connection.execute(
+                "SELECT value, accessed FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            if now - row[1] > ACCESS_UPDATE_INTERVAL:
+                try:
+                    connection.execute(
+                        "UPDATE cache SET accessed = ? WHERE key = ?", (now, key)
+                    )
+                except sqlite3.OperationalError:
+                    # Another process holds the write lock; the refresh can wait.
+                    pass
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        """Store `value` (a string) under `key`, evicting old entries if needed."""
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            connection = self.connect()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, size, time.time()),
+                )
+                self.evict(connection)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+
+    def evict(self, connection):
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until the cache is back under its bound.
+        rows = connection.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        connection.executemany("DELETE FROM cache WHERE key = ?", evicted)
+        logger.info("Evicted %d entries from shared cache", len(evicted))
+
+    def clear(self):
+        with self.lock:
+            self.connect().execute("DELETE FROM cache")
+
+    def close(self):
+        with self.lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+
+
+async def cache_get(cache, key):
+    """Look `key` up off the event loop; any cache failure is logged and counts as a miss."""
+    try:
+        return await asyncio.to_thread(cache.get, key)
+    except Exception:
+        logger.warning("Shared cache read failed for %s", key, exc_info=True)
+        return None
+
+
+async def cache_set(cache, key, value):
+    """Store `value` off the event loop; any cache failure is logged and the write skipped."""
+    try:
+        await asyncio.to_thread(cache.set, key, value)
+    except Exception:
+        logger.warning("Shared cache write failed for %s", key, exc_info=True)
+
+
+def get_shared_cache():
+    """Return this process's handle on the shared cache, or None if it is disabled.
+
+    Set `SHARED_CACHE_PATH` to move the cache file (an empty value disables
+    caching) and `SHARED_CACHE_MAX_MB` to change its size bound.
+    """
+    global _shared_cache
+    if _shared_cache is None:
+        path = os.environ.get("SHARED_CACHE_PATH", DEFAULT_CACHE_PATH)
+        if not path:
+            return None
+        max_mb = os.environ.get("SHARED_CACHE_MAX_MB")
+        max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+        _shared_cache = SharedCache(path, max_bytes)
+    return _shared_cache
+
+
+_shared_cache = None
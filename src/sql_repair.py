@@ -0,0 +1,279 @@
+import difflib
+import logging
+import re
+import sqlite3
+from contextvars import ContextVar
+
+from cache import db_version
+
+MAX_REPAIRS = 5
+# TEXT columns with at most this many distinct values, each repeated on average
+# at least 1 / ENUM_MAX_RATIO times, are treated as enums.
+ENUM_MAX_VALUES = 20
+ENUM_MAX_RATIO = 0.5
+
+# String literals, so identifiers are never rewritten inside them.
+LITERAL_RE = re.compile(r"('(?:[^']|'')*')")
+MISSING_RE = re.compile(r"no such (column|table): (?:main\.)?([\w.]+)")
+ALIAS_RE = re.compile(r"\b(?:from|join)\s+[\"`]?(\w+)[\"`]?(?:\s+(?:as\s+)?(\w+))?", re.IGNORECASE)
+ALIAS_KEYWORDS = {"where", "join", "on", "left", "right", "inner", "outer", "cross",
+                  "natural", "group", "order", "limit", "union", "having", "using"}
+
+logger = logging.getLogger(__name__)
+
+# Corrections applied during the current chat turn; see `start_turn`.
+turn_corrections = ContextVar("turn_corrections", default=None)
+
+_schemas = {}
+
+
+def start_turn():
+    """Begin counting corrections for a new user question."""
+    turn_corrections.set([])
+
+
+def iterations_saved():
+    """Number of LLM round trips avoided by local repairs in the current turn.
+
+    Each repaired query would otherwise have returned an error (or an empty
+    result for a miscased enum value) and cost the model another iteration.
+    """
+    corrections = turn_corrections.get()
+    return len(corrections) if corrections else 0
+
+
+def load_schema(db_path):
+    """Read tables, columns and enum domains from the live database, once per build."""
+    version = db_version(db_path)
+    if version in _schemas:
+        return _schemas[version]
+
+    connection = sqlite3.connect(db_path)
+    try:
+        tables = [
+            row[0] for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+            )
+        ]
+        table_names = {table.lower(): table for table in tables}
+
+        def distinct_values(table, column):
+            return sorted(
+                row[0] for row in connection.execute(
+                    f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL'
+                )
+            )
+
+        # Enum domains are keyed by (table, lower-case column name). Names, emails
+        # and phones are mostly unique per row, so the ratio check leaves them out.
+        columns = {}
+        enums = {}
+        for table in tables:
+            columns[table] = []
+            row_count = connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            for _, column, column_type, *_ in connection.execute(f'PRAGMA table_info("{table}")'):
+                columns[table].append(column)
+                if column_type.upper() != "TEXT" or not row_count:
+                    continue
+                values = distinct_values(table, column)
+                if len(values) <= ENUM_MAX_VALUES and len(values) <= row_count * ENUM_MAX_RATIO:
+                    enums[(table, column.lower())] = values
+
+        # Lookup tables such as terms hold each value once, so they share the
+        # domain of any enum column that references them.
+        for table in tables:
+            for fk in connection.execute(f'PRAGMA foreign_key_list("{table}")').fetchall():
+                parent, from_column, to_column = table_names.get(fk[2].lower()), fk[3], fk[4]
+                if parent and to_column and (table, from_column.lower()) in enums:
+                    enums[(parent, to_column.lower())] = distinct_values(parent, to_column)
+    finally:
+        connection.close()
+
+    schema = {"tables": tables, "columns": columns, "enums": enums}
+    _schemas[version] = schema
+    return schema
+
+
+def closest(name, candidates):
+    """Return the single candidate `name` was clearly meant to be, or None if unsure."""
+    candidates = sorted(set(candidates))
+
+    def normalise(identifier):
+        return identifier.replace("_", "").lower()
+
+    same = [c for c in candidates if normalise(c) == normalise(name)]
+    if same:
+        return same[0] if len(same) == 1 else None
+    lowered = {c.lower(): c for c in candidates}
+    matches = difflib.get_close_matches(name.lower(), list(lowered), n=2, cutoff=0.8)
+    return lowered[matches[0]] if len(matches) == 1 else None
+
+
+def replace_outside_literals(sql_query, pattern, replacement):
+    parts = LITERAL_RE.split(sql_query)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(pattern, replacement, parts[i])
+    return "".join(parts)
+
+
+def table_for(qualifier, sql_query, schema):
+    """Resolve a column qualifier, which may be a table name or an alias, to a table."""
+    tables = {table.lower(): table for table in schema["tables"]}
+    if qualifier.lower() in tables:
+        return tables[qualifier.lower()]
+    for table, alias in ALIAS_RE.findall(sql_query):
+        if alias and alias.lower() == qualifier.lower() and alias.lower() not in ALIAS_KEYWORDS:
+            return tables.get(table.lower())
+    return None
+
+
+def statement_tables(sql_query, schema):
+    """Tables named in the statement's FROM and JOIN clauses, in order."""
+    tables = {table.lower(): table for table in schema["tables"]}
+    found = []
+    for table, _ in ALIAS_RE.findall(sql_query):
+        table = tables.get(table.lower())
+        if table and table not in found:
+            found.append(table)
+    return found
+
+
+def columns_hint(tables, schema):
+    return " ".join(f"Columns of {table}: {', '.join(schema['columns'][table])}." for table in tables)
+
+
+def repair_identifier(kind, name, sql_query, schema):
+    """Fix one unknown table or column reported by SQLite.
+
+    Returns the corrected query and a description of the change, or the
+    original query and a hint for the model when the fix is ambiguous.
+    """
+    if kind == "table":
+        fixed = closest(name, schema["tables"])
+        if not fixed:
+            return sql_query, None, f"Available tables: {', '.join(schema['tables'])}."
+        pattern = rf"(?<![\w.]){re.escape(name)}\b"
+        return (
+            replace_outside_literals(sql_query, pattern, fixed),
+            f"table {name} -> {fixed}",
+            None,
+        )
+
+    qualifier, _, column = name.rpartition(".")
+    table = table_for(qualifier, sql_query, schema) if qualifier else None
+    # Unqualified columns can only come from the tables the statement reads.
+    candidate_tables = [table] if table else statement_tables(sql_query, schema) or schema["tables"]
+    candidates = [c for t in candidate_tables for c in schema["columns"][t]]
+    fixed = closest(column, candidates)
+    # SQLite already matches names case-insensitively, so a case-only match is no fix.
+    if not fixed or fixed.lower() == column.lower():
+        hint_tables = [table] if table else statement_tables(sql_query, schema)
+        return sql_query, None, columns_hint(hint_tables, schema) if hint_tables else None
+    prefix = rf"{re.escape(qualifier)}\." if qualifier else r"(?<![\w.])"
+    return (
+        replace_outside_literals(sql_query, rf"{prefix}{re.escape(column)}\b",
+                                 lambda m: m.group(0)[:-len(column)] + fixed),
+        f"column {name} -> {fixed}",
+        None,
+    )
+
+
+def repair_enum_values(sql_query, schema):
+    """Fix the case of literals compared against enum columns, e.g. 'autumn' -> 'Autumn'.
+
+    Each comparison is checked against the domain of the column's own table,
+    resolved from its qualifier or, when unqualified, from the single table
+    in the statement that has the column.
+    """
+    corrections = []
+    original = sql_query
+    tables_in_query = statement_tables(sql_query, schema)
+
+    def domain_for(qualifier, column):
+        if qualifier:
+            table = table_for(qualifier, original, schema)
+        else:
+            owners = [
+                t for t in tables_in_query
+                if column in (c.lower() for c in schema["columns"][t])
+            ]
+            table = owners[0] if len(owners) == 1 else None
+        return schema["enums"].get((table, column))
+
+    def fix_literal(literal, domain):
+        value = literal[1:-1].replace("''", "'")
+        if domain is None or value in domain:
+            return literal
+        matches = [v for v in domain if v.lower() == value.strip().lower()]
+        if len(matches) != 1:
+            return literal
+        corrections.append(f"value '{value}' -> '{matches[0]}'")
+        return "'" + matches[0].replace("'", "''") + "'"
+
+    for column in sorted({column for _, column in schema["enums"]}):
+        if not re.search(rf"\b{re.escape(column)}\b", sql_query, re.IGNORECASE):
+            continue
+        sql_query = re.sub(
+            rf"((?:\b(\w+)\.)?\b{re.escape(column)}\s*(?:=|==|!=|<>)\s*)('(?:[^']|'')*')",
+            lambda m: m.group(1) + fix_literal(m.group(3), domain_for(m.group(2), column)),
+            sql_query,
+            flags=re.IGNORECASE,
+        )
+        sql_query = re.sub(
+            rf"((?:\b(\w+)\.)?\b{re.escape(column)}\s+(?:not\s+)?in\s*\()([^)]*)(\))",
+            lambda m: m.group(1) + LITERAL_RE.sub(
+                lambda lit: fix_literal(lit.group(1), domain_for(m.group(2), column)),
+                m.group(3),
+            ) + m.group(4),
+            sql_query,
+            flags=re.IGNORECASE,
+        )
+    return sql_query, corrections
+
+
+def prepare_sql(sql_query, db_path):
+    """Compile `sql_query` against the live schema and repair unambiguous mistakes.
+
+    Returns `(sql_query, corrections, hint)`: the query to run, a list of
+    human-readable corrections that were applied, and a hint describing the
+    schema when a remaining error could not be fixed locally. Corrections
+    only count towards `iterations_saved` when the repaired statement compiles.
+    """
+    schema = load_schema(db_path)
+    corrections = []
+    hint = None
+    compiles = False
+    last_error = None
+
+    connection = sqlite3.connect(db_path)
+    try:
+        for _ in range(MAX_REPAIRS + 1):
+            try:
+                # EXPLAIN prepares the statement without executing it.
+                connection.execute(f"EXPLAIN {sql_query}")
+                compiles = True
+                break
+            except sqlite3.Error as error:
+                match = MISSING_RE.search(str(error))
+                if not match or str(error) == last_error or len(corrections) == MAX_REPAIRS:
+                    break
+                last_error = str(error)
+                repaired, correction, hint = repair_identifier(
+                    match.group(1), match.group(2), sql_query, schema
+                )
+                if not correction or repaired == sql_query:
+                    break
+                sql_query = repaired
+                corrections.append(correction)
+    finally:
+        connection.close()
+
+    sql_query, enum_corrections = repair_enum_values(sql_query, schema)
+    corrections.extend(enum_corrections)
+
+    if corrections:
+        logger.info(f"Repaired SQL ({'; '.join(corrections)}): {sql_query}")
+        turn = turn_corrections.get()
+        if compiles and turn is not None:
+            turn.append(corrections)
+    return sql_query, corrections, hint
@@ -1,11 +1,21 @@
+import json
 import os
+import re
 import sqlite3
 
 import plotly.graph_objs as go
 import plotly.io as pio
 
+from cache import cache_get, cache_set, db_version, get_shared_cache, make_key
+from sql_repair import LITERAL_RE, prepare_sql
 from utils import convert_to_json, json_to_markdown_table
 
+# Get the directory of the current script (e.g. src/)
+script_dir = os.path.dirname(os.path.realpath(__file__))
+# Compute the database path relative to the project directory:
+# project structure: project_root/data/db/school.db
+DB_PATH = os.path.join(script_dir, "..", "data", "db", "school.db")
+
 # function calling
 # avialable tools
 tools_schema = [
@@ -75,18 +85,88 @@ tools_schema = [
 ]
 
 
+# Authorizer actions a statement may perform and still be served from the cache.
+READ_ONLY_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+}
+# Functions whose result depends on the clock, randomness or connection state.
+NON_DETERMINISTIC_FUNCTIONS = {
+    "random", "randomblob", "date", "time", "datetime", "julianday", "strftime",
+    "unixepoch", "changes", "last_insert_rowid",
+}
+# Keywords that read the clock but never reach the authorizer.
+CURRENT_TIME_RE = re.compile(r"\bcurrent_(?:date|time|timestamp)\b", re.IGNORECASE)
+
+
+def is_read_only(sql_query):
+    """Only deterministic statements that read data are safe to serve from the cache.
+
+    The statement is compiled with an authorizer that records every action,
+    so `WITH ... DELETE` and similar DML behind a CTE are caught, as are
+    calls to clock and random functions.
+    """
+    if CURRENT_TIME_RE.search(LITERAL_RE.sub("''", sql_query)):
+        return False
+    read_only = True
+
+    def authorizer(action, *args):
+        nonlocal read_only
+        if action not in READ_ONLY_ACTIONS:
+            read_only = False
+        elif action == sqlite3.SQLITE_FUNCTION and args[1].lower() in NON_DETERMINISTIC_FUNCTIONS:
+            read_only = False
+        return sqlite3.SQLITE_OK
+
+    connection = sqlite3.connect(DB_PATH)
+    try:
+        connection.set_authorizer(authorizer)
+        connection.execute(f"EXPLAIN {sql_query}")
+    except sqlite3.Error:
+        return False
+    finally:
+        connection.close()
+    return read_only
+
+
+def correction_note(corrections):
+    """Tell the model which mistakes were fixed so it does not repeat them."""
+    if not corrections:
+        return ""
+    return f"Note: the query was corrected before running ({'; '.join(corrections)}).\n\n"
+
+
 async def run_sqlite_query(sql_query, markdown=True):
+    # Fix unambiguous table, column and enum value mistakes locally instead of
+    # spending another LLM round trip on the error.
+    sql_query, corrections, hint = prepare_sql(sql_query, DB_PATH)
+    return await run_prepared_query(sql_query, corrections, hint, markdown)
+
+
+async def run_prepared_query(sql_query, corrections=(), hint=None, markdown=True):
+    """Run a statement returned by `prepare_sql`, reporting its corrections to the model."""
+    # Results are shared between worker processes and keyed by database build,
+    # so re-initialising the database invalidates them.
+    cache = get_shared_cache()
+    if cache and not is_read_only(sql_query):
+        cache = None
+    if cache:
+        cache_key = make_key(db_version(DB_PATH), "query", [sql_query, markdown])
+        cached = await cache_get(cache, cache_key)
+        if cached is not None:
+            if markdown:
+                return correction_note(corrections) + cached
+            cached = json.loads(cached)
+            return [tuple(row) for row in cached["rows"]], cached["columns"]
+
     connection = None
     try:
-        # Get the directory of the current script (e.g. src/)
-        script_dir = os.path.dirname(os.path.realpath(__file__))
-        # Compute the database path relative to the project directory:
-        # project structure: project_root/data/db/school.db
-        db_path = os.path.join(script_dir, "..", "data", "db", "school.db")
-        print(f"Using database at: {db_path}")
+        print(f"Using database at: {DB_PATH}")
         
         # Establish the connection
-        connection = sqlite3.connect(db_path)
+        connection = sqlite3.connect(DB_PATH)
         cursor = connection.cursor()
 
         # Execute the query
@@ -96,18 +176,12 @@ async def run_sqlite_query(sql_query, markdown=True):
         column_names = [desc[0] for desc in cursor.description] if cursor.description else []
         result = cursor.fetchall()
 
-        if markdown:
-            # Convert result to JSON format then to markdown table.
-            json_data = convert_to_json(result, column_names)
-            markdown_data = json_to_markdown_table(json_data)
-            return markdown_data
-
-        return result, column_names
-
     except sqlite3.Error as error:
         print("Error while executing the query:", error)
         if markdown:
-            return f"Error while executing the query: {error}"
+            message = f"Error while executing the query: {error}"
+            message = correction_note(corrections) + message
+            return f"{message} {hint}" if hint else message
         return [], []
 
     finally:
@@ -116,6 +190,20 @@ async def run_sqlite_query(sql_query, markdown=True):
             connection.close()
             print("SQLite connection is closed")
 
+    if markdown:
+        # Convert result to JSON format then to markdown table.
+        json_data = convert_to_json(result, column_names)
+        markdown_data = json_to_markdown_table(json_data)
+        if cache:
+            await cache_set(cache, cache_key, markdown_data)
+        return correction_note(corrections) + markdown_data
+
+    if cache:
+        await cache_set(
+            cache, cache_key, json.dumps({"rows": result, "columns": column_names}, default=str)
+        )
+    return result, column_names
+
 
 async def plot_chart(
     x_values,
@@ -140,6 +228,18 @@ async def plot_chart(
     if len(x_values) != len(y_values):
         raise ValueError("Lengths of x_values and y_values must be the same.")
 
+    # Reuse a figure another worker has already built for the same arguments.
+    cache = get_shared_cache()
+    if cache:
+        cache_key = make_key(
+            db_version(DB_PATH),
+            "plot",
+            [x_values, y_values, plot_title, x_label, y_label, plot_type],
+        )
+        cached = await cache_get(cache, cache_key)
+        if cached is not None:
+            return pio.from_json(cached)
+
     # Define plotly trace based on plot_type
     if plot_type == "bar":
         trace = go.Bar(
@@ -184,5 +284,7 @@ async def plot_chart(
 
     # Create figure and add trace to it
     fig = go.Figure(data=[trace], layout=layout)
+    if cache:
+        await cache_set(cache, cache_key, fig.to_json())
 
     return fig